@@ -6,14 +6,25 @@ Features:
 1. Searches for imagery that fully covers Seoul (Cover > 99%) for each season in 2025.
 2. [Update] Delayed the Spring period to after mid-April to acquire imagery with high vegetation vitality.
 3. Downloads the optimal image with the least cloud cover among them.
+4. Seasons are searched and bands are downloaded concurrently (network-bound).
 """
 
 import os
+import threading
+import numpy as np
 import geopandas as gpd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from pystac_client import Client
+from pystac_client.stac_api_io import StacApiIO
+from requests.adapters import HTTPAdapter
 import planetary_computer
-import rioxarray
+import rasterio
+from rasterio.features import geometry_mask
+from rasterio.io import MemoryFile
+from rasterio.shutil import copy as rio_copy
+from rasterio.windows import Window, from_bounds
+import shapely
 from shapely.geometry import mapping, shape 
 
 # ──────────────────────────────────────────────────────────
@@ -35,72 +46,194 @@ SEASONS = {
 
 SEARCH_CLOUD_LIMIT = 50 
 MIN_COVERAGE_PCT = 99.0
+# Coverage test uses a simplified boundary (~500 m in EPSG:4326); the 99% threshold is not sensitive to it
+AOI_SIMPLIFY_TOL = 0.005
+
+# Network-bound work (STAC queries, COG range reads) runs in thread pools
+SEARCH_WORKERS = 8
+DOWNLOAD_WORKERS = len(REQUIRED_ASSETS)
+HTTP_POOL_SIZE = 16
+
+_PRINT_LOCK = threading.Lock()
+
+# Retries (extend_days 0/14/30) overlap heavily, so STAC results and parsed footprints are memoized
+_GEOM_CACHE = {}    # item.id -> shapely footprint
+_SEARCH_CACHE = {}  # (start_date, end_date, cloud_limit) -> list of items
+_CACHE_LOCK = threading.Lock()
 
 # ──────────────────────────────────────────────────────────
 # 2. Utility Functions
 # ──────────────────────────────────────────────────────────
+def log(msg):
+    # Seasons and bands are processed concurrently; keep each line intact
+    with _PRINT_LOCK:
+        print(msg)
+
 def get_aoi_gdf(geojson_path):
     if not os.path.exists(geojson_path):
         raise FileNotFoundError(f"❌ Boundary file not found: {geojson_path}")
     return gpd.read_file(geojson_path)
 
+def scene_epsg(item):
+    epsg = item.properties.get("proj:epsg")
+    if epsg is None:
+        # Newer STAC projection extension: "proj:code": "EPSG:32652"
+        code = item.properties.get("proj:code") or ""
+        if code.upper().startswith("EPSG:"): epsg = int(code.split(":")[1])
+    return epsg
+
 def download_cropped_asset(url, save_path, aoi_gdf):
+    """
+    aoi_gdf is normally already projected to the scene CRS (once per scene, see main);
+    it is only reprojected here if the band turns out to be in a different CRS.
+    """
     if os.path.exists(save_path):
-        print(f"    [Skip] Already exists: {os.path.basename(save_path)}")
+        log(f"    [Skip] Already exists: {os.path.basename(save_path)}")
         return
     try:
-        with rioxarray.open_rasterio(url) as src:
-            aoi_projected = aoi_gdf.to_crs(src.rio.crs)
-            clipped = src.rio.clip(aoi_projected.geometry, from_disk=True)
-            clipped.rio.to_raster(save_path, compress='LZW', tiled=True, dtype='float32')
-        print(f"    [Done] Download complete: {os.path.basename(save_path)}")
+        with rasterio.open(url) as src:
+            aoi_projected = aoi_gdf if aoi_gdf.crs == src.crs else aoi_gdf.to_crs(src.crs)
+
+            # Only the COG tiles under the AOI window are fetched (HTTP range reads).
+            # Pad by one pixel so edge pixels of the boundary are not cut off.
+            xres, yres = src.res
+            left, bottom, right, top = aoi_projected.total_bounds
+            window = from_bounds(left - xres, bottom - yres, right + xres, top + yres, transform=src.transform)
+            window = window.round_offsets().round_lengths().intersection(Window(0, 0, src.width, src.height))
+
+            # Keep the native dtype (uint16 reflectance / uint8 SCL)
+            data = src.read(1, window=window)
+            transform = src.window_transform(window)
+            nodata = src.nodata if src.nodata is not None else 0
+
+            # Same result as clip(): pixels outside the Seoul boundary become nodata
+            outside = geometry_mask(aoi_projected.geometry, out_shape=data.shape, transform=transform)
+            data[outside] = nodata
+
+            profile = {
+                "driver": "GTiff", "count": 1, "dtype": src.dtypes[0],
+                "height": data.shape[0], "width": data.shape[1],
+                "crs": src.crs, "transform": transform, "nodata": nodata,
+            }
+
+        with MemoryFile() as mem:
+            with mem.open(**profile) as tmp:
+                tmp.write(data, 1)
+                rio_copy(tmp, save_path, driver="COG", compress="DEFLATE", predictor=2,
+                         blocksize=512, overviews="AUTO")
+        log(f"    [Done] Download complete: {os.path.basename(save_path)}")
     except Exception as e:
-        print(f"    [Fail] Download failed: {e}")
+        log(f"    [Fail] Download failed: {e}")
         if os.path.exists(save_path): os.remove(save_path)
 
-def search_best_full_cover_item(catalog, geom, aoi_shape, date_ranges, cloud_limit, extend_days=0):
+def item_geometry(item):
+    geom = _GEOM_CACHE.get(item.id)
+    if geom is None:
+        geom = _GEOM_CACHE[item.id] = shape(item.geometry)
+    return geom
+
+def stac_search(catalog, geom, intervals, cloud_limit):
+    """
+    One STAC request for any number of [start, end] day intervals.
+    The STAC `datetime` parameter only takes a single interval, so they are OR-ed in a CQL2 filter.
+    """
+    if not intervals:
+        return []
+    time_ops = [
+        {"op": "t_intersects", "args": [
+            {"property": "datetime"},
+            {"interval": [f"{s.strftime('%Y-%m-%d')}T00:00:00Z", f"{e.strftime('%Y-%m-%d')}T23:59:59Z"]}
+        ]}
+        for s, e in intervals
+    ]
+    cql = {"op": "and", "args": [
+        {"op": "<", "args": [{"property": "eo:cloud_cover"}, cloud_limit]},
+        time_ops[0] if len(time_ops) == 1 else {"op": "or", "args": time_ops},
+    ]}
+    search = catalog.search(
+        collections=["sentinel-2-l2a"],
+        intersects=geom,
+        filter=cql,
+        filter_lang="cql2-json"
+    )
+    return list(search.item_collection())
+
+def split_cached(s_date, e_date, cloud_limit):
+    """
+    Returns (cached items, missing intervals) for a day range: the widest range already
+    fetched inside it is reused and only the new edges still have to be queried.
+    """
+    key = (s_date, e_date, cloud_limit)
+    with _CACHE_LOCK:
+        if key in _SEARCH_CACHE:
+            return _SEARCH_CACHE[key], []
+        fetched = list(_SEARCH_CACHE)
+
+    inner = max((k for k in fetched if k[2] == cloud_limit and s_date <= k[0] and k[1] <= e_date),
+                key=lambda k: k[1] - k[0], default=None)
+    if inner is None:
+        return [], [(s_date, e_date)]
+
+    missing = []
+    if s_date < inner[0]:
+        missing.append((s_date, inner[0] - timedelta(days=1)))
+    if inner[1] < e_date:
+        missing.append((inner[1] + timedelta(days=1), e_date))
+    return list(_SEARCH_CACHE[inner]), missing
+
+def search_best_full_cover_item(catalog, geom, aoi_shape, date_ranges, cloud_limit, extend_days=0, tag=""):
     """
     Finds the optimal image considering both cloud cover and coverage (area).
     """
-    raw_candidates = []
+    raw_candidates = {}
     
     # 1. Date range extension and STAC search
-    search_ranges = []
     if extend_days > 0:
-        print(f"  ↪ No suitable image within period. Extending search by ±{extend_days} days...")
+        log(f"  ↪ [{tag}] No suitable image within period. Extending search by ±{extend_days} days...")
         
+    plans, missing = [], []
     for start, end in date_ranges:
         s_date = datetime.strptime(start, "%Y-%m-%d") - timedelta(days=extend_days)
         e_date = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=extend_days)
-        search_ranges.append(f"{s_date.strftime('%Y-%m-%d')}/{e_date.strftime('%Y-%m-%d')}")
+        cached, gaps = split_cached(s_date, e_date, cloud_limit)
+        plans.append((s_date, e_date, cached))
+        missing.extend(gaps)
+
+    # A single request per season, covering every range that is not cached yet
+    new_items = stac_search(catalog, geom, missing, cloud_limit)
 
-    for dr in search_ranges:
-        search = catalog.search(
-            collections=["sentinel-2-l2a"],
-            intersects=geom,
-            datetime=dr,
-            query={"eo:cloud_cover": {"lt": cloud_limit}}
-        )
-        raw_candidates.extend(list(search.item_collection()))
+    for s_date, e_date, cached in plans:
+        items = cached + [it for it in new_items if s_date.date() <= it.datetime.date() <= e_date.date()]
+        with _CACHE_LOCK:
+            _SEARCH_CACHE[(s_date, e_date, cloud_limit)] = items
+        for item in items:
+            raw_candidates[item.id] = item
 
+    raw_candidates = list(raw_candidates.values())
     if not raw_candidates:
         return None
 
-    # 2. Coverage filtering
-    valid_candidates = []
+    # 2. Coverage filtering (one vectorized GEOS call over all footprints)
     aoi_area = aoi_shape.area 
     
-    print(f"  🔍 Checking 'Full Seoul Coverage' for {len(raw_candidates)} candidates...")
+    log(f"  🔍 [{tag}] Checking 'Full Seoul Coverage' for {len(raw_candidates)} candidates...")
     
-    for item in raw_candidates:
-        item_geom = shape(item.geometry)
-        intersection_area = aoi_shape.intersection(item_geom).area
-        coverage_pct = (intersection_area / aoi_area) * 100.0
-        
-        if coverage_pct >= MIN_COVERAGE_PCT:
-            valid_candidates.append(item)
+    geoms = np.array([item_geometry(item) for item in raw_candidates], dtype=object)
+    coverage_pct = np.zeros(len(geoms))
+
+    # Fast path: footprints that fully cover the AOI need no intersection at all
+    tree = shapely.STRtree(geoms)
+    covers_idx = tree.query(aoi_shape, predicate="covered_by")
+    coverage_pct[covers_idx] = 100.0
+
+    # Exact area only for the partially overlapping remainder
+    rest = np.ones(len(geoms), dtype=bool)
+    rest[covers_idx] = False
+    if rest.any():
+        coverage_pct[rest] = shapely.area(shapely.intersection(aoi_shape, geoms[rest])) / aoi_area * 100.0
+    valid_candidates = [item for item, ok in zip(raw_candidates, coverage_pct >= MIN_COVERAGE_PCT) if ok]
     
-    print(f"  ✓ Candidates satisfying condition (Cover>{MIN_COVERAGE_PCT}%): {len(valid_candidates)}")
+    log(f"  ✓ [{tag}] Candidates satisfying condition (Cover>{MIN_COVERAGE_PCT}%): {len(valid_candidates)}")
 
     if not valid_candidates:
         return None
@@ -112,6 +245,17 @@ def search_best_full_cover_item(catalog, geom, aoi_shape, date_ranges, cloud_lim
 # ──────────────────────────────────────────────────────────
 # 3. Main Logic
 # ──────────────────────────────────────────────────────────
+def find_season_item(catalog, season, ranges, search_geom, aoi_shape):
+    log(f"\n🌸 [{season}] Searching for optimal image...")
+
+    # Widen the window step by step until a fully covering scene shows up
+    for extend_days in (0, 14, 30):
+        best_item = search_best_full_cover_item(catalog, search_geom, aoi_shape, ranges, SEARCH_CLOUD_LIMIT,
+                                                extend_days=extend_days, tag=season)
+        if best_item is not None:
+            return best_item
+    return None
+
 def main():
     print(f"--- Sentinel-2 Full Coverage Download (Seoul: Tuned Season) ---")
     
@@ -120,44 +264,62 @@ def main():
         aoi_gdf_4326 = aoi_gdf.to_crs(epsg=4326)
         search_geom = mapping(aoi_gdf_4326.geometry.iloc[0])
         aoi_shape = shape(search_geom)
+        # Full-resolution aoi_gdf is still used for the actual crop
+        aoi_simple = aoi_shape.simplify(AOI_SIMPLIFY_TOL, preserve_topology=True)
     except Exception as e:
         print(f"❌ Error: {e}")
         return
 
-    catalog = Client.open("https://planetarycomputer.microsoft.com/api/stac/v1", modifier=planetary_computer.sign_inplace)
+    # One shared session so concurrent STAC queries reuse pooled TLS connections
+    stac_io = StacApiIO()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=3)
+    stac_io.session.mount("https://", adapter)
+    catalog = Client.open("https://planetarycomputer.microsoft.com/api/stac/v1",
+                          modifier=planetary_computer.sign_inplace, stac_io=stac_io)
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-    for season, ranges in SEASONS.items():
-        print(f"\n🌸 [{season}] Searching for optimal image...")
-        
-        best_item = search_best_full_cover_item(catalog, search_geom, aoi_shape, ranges, SEARCH_CLOUD_LIMIT, extend_days=0)
-        
-        if best_item is None:
-            best_item = search_best_full_cover_item(catalog, search_geom, aoi_shape, ranges, SEARCH_CLOUD_LIMIT, extend_days=14)
+    # 1. Search all seasons concurrently
+    selections = {}
+    with ThreadPoolExecutor(max_workers=min(SEARCH_WORKERS, len(SEASONS))) as pool:
+        futures = {
+            pool.submit(find_season_item, catalog, season, ranges, search_geom, aoi_simple): season
+            for season, ranges in SEASONS.items()
+        }
+        for fut in as_completed(futures):
+            selections[futures[fut]] = fut.result()
+
+    # 2. Download the bands of every selected scene concurrently
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+        jobs = []
+        for season in SEASONS:
+            best_item = selections.get(season)
+            if best_item is None:
+                log(f"\n  ⚠️ [{season}] Failed: No clear image covering the entire Seoul area within the period.")
+                continue
+
+            d_str = best_item.datetime.strftime("%Y-%m-%d")
+            cc = best_item.properties['eo:cloud_cover']
+            log(f"\n  ✅ [{season}] Final Selection: {d_str} (Cloud: {cc:.2f}%) - Full Seoul Coverage")
+            
+            scene_dir = os.path.join(OUTPUT_DIR, best_item.id)
+            os.makedirs(scene_dir, exist_ok=True)
             
-        if best_item is None:
-            best_item = search_best_full_cover_item(catalog, search_geom, aoi_shape, ranges, SEARCH_CLOUD_LIMIT, extend_days=30)
+            # All bands of a scene share its UTM zone: reproject the AOI once, not per band
+            epsg = scene_epsg(best_item)
+            aoi_proj = aoi_gdf.to_crs(epsg=epsg) if epsg else aoi_gdf
 
-        if best_item is None:
-            print(f"  ⚠️ Failed: No clear image covering the entire Seoul area within the period.")
-            continue
+            assets = best_item.assets
+            for key in REQUIRED_ASSETS:
+                if key in assets:
+                    url = assets[key].href
+                    fname = url.split("?")[0].split("/")[-1]
+                    save_path = os.path.join(scene_dir, fname)
+                    jobs.append(pool.submit(download_cropped_asset, url, save_path, aoi_proj))
+                else:
+                    log(f"    [Warn] {season}: {key} band missing")
 
-        d_str = best_item.datetime.strftime("%Y-%m-%d")
-        cc = best_item.properties['eo:cloud_cover']
-        print(f"  ✅ Final Selection: {d_str} (Cloud: {cc:.2f}%) - Full Seoul Coverage")
-        
-        scene_dir = os.path.join(OUTPUT_DIR, best_item.id)
-        os.makedirs(scene_dir, exist_ok=True)
-        
-        assets = best_item.assets
-        for key in REQUIRED_ASSETS:
-            if key in assets:
-                url = assets[key].href
-                fname = url.split("?")[0].split("/")[-1]
-                save_path = os.path.join(scene_dir, fname)
-                download_cropped_asset(url, save_path, aoi_gdf)
-            else:
-                print(f"    [Warn] {key} band missing")
+        for job in as_completed(jobs):
+            job.result()
 
     print("\n🎉 All downloads complete.")
 
@@ -7,16 +7,35 @@ B_S2_JSON_Gen.py
 - [Update] Relaxed Vegetation threshold (0.3 -> 0.2).
 - [Update] Strengthened Buildings threshold (0.0 -> 0.05) to remove noise.
 - [Update] Precise calculation of 'Area Percentage (%)' for visualization.
+- [Update] Masking and NDVI/NDBI/NDWI fused into one Numba kernel (NumPy fallback if Numba is missing).
 """
 
 import os
+import math
 import glob
 import json
 import re
 import numpy as np
 import rasterio
+from multiprocessing import Pool, cpu_count
+from xml.sax.saxutils import escape
 from rasterio.enums import Resampling
 
+try:
+    import orjson
+except ImportError:  # Standard json fallback
+    orjson = None
+
+try:
+    import numba
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:  # Falls back to the NumPy path (slower, same results)
+    HAS_NUMBA = False
+    prange = range
+    def njit(*args, **kwargs):
+        return lambda f: f
+
 BASE_DIR = os.getcwd()
 RAW_S2_DIR = os.path.join(BASE_DIR, "raw_data", "Sentinel-2")
 OUT_SCORE_DIR = os.path.join(BASE_DIR, "processed_data", "Daily_Music_Scores")
@@ -24,9 +43,18 @@ os.makedirs(OUT_SCORE_DIR, exist_ok=True)
 
 # Band 03(Green), 04(Red), 08(NIR), 11(SWIR), SCL(Scene Classification)
 TARGET_BANDS = ["B03", "B04", "B08", "B11", "SCL"] 
+# 20m bands are read onto the 10m grid; SCL is categorical so it must stay nearest
+BAND_RESAMPLING = {"B11": Resampling.bilinear, "SCL": Resampling.nearest}
 VALID_SCL_CLASSES = [4, 5, 6, 7] # 4: Vegetation, 5: Bare Soils, 6: Water, 7: Unclassified
+# SCL is uint8 (0-11), so validity is a single table lookup instead of np.isin
+VALID_SCL_LUT = np.zeros(256, dtype=np.bool_)
+VALID_SCL_LUT[VALID_SCL_CLASSES] = True
+
+# Acquisition date in the S2 file name, e.g. ..._20250420T021529_...
+_DATE_RE = re.compile(r"_(\d{8})T")
 
 SCAN_STRIDE = 10
+MAX_WORKERS = 4  # One per seasonal scene
 
 # ★ [Key Modification] Threshold Tuning
 # Lowered from 0.3 to 0.2 to detect spring sprouts and urban green spaces better
@@ -36,15 +64,148 @@ BUILD_THRESHOLD = 0.05
 # Water detection threshold (kept as is)
 WATER_THRESHOLD = 0.0   
 
-def calculate_index(b1, b2):
-    denom = b1 + b2
-    denom[denom == 0] = 0.0001
-    return (b1 - b2) / denom
+def calculate_index(b1, b2, out=None, tmp=None):
+    # In-place float32 (b1 - b2) / (b1 + b2); pass `out`/`tmp` to avoid temporaries
+    if out is None: out = np.empty(b1.shape, dtype=np.float32)
+    if tmp is None: tmp = np.empty_like(out)
+    # dtype=float32 does the math in float32 even for uint16 bands (no wrap-around, no astype copy)
+    np.add(b1, b2, out=tmp, dtype=np.float32)
+    np.subtract(b1, b2, out=out, dtype=np.float32)
+    # Where b1 + b2 == 0 the numerator is already 0 (reflectance is non-negative)
+    np.divide(out, tmp, out=out, where=(tmp != 0))
+    return out
+
+# Index buffers are reused across dates while the scene grid stays the same
+_INDEX_BUFFERS = {}
+
+def get_index_buffers(shape):
+    if shape not in _INDEX_BUFFERS:
+        _INDEX_BUFFERS.clear()
+        _INDEX_BUFFERS[shape] = tuple(np.empty(shape, dtype=np.float32) for _ in range(3))
+    return _INDEX_BUFFERS[shape]
+
+# nnan/ninf are left out of fastmath since invalid pixels are NaN by design
+FASTMATH_FLAGS = {"nsz", "arcp", "contract", "afn", "reassoc"}
+
+# Fused kernel: SCL/nodata masking + NDVI/NDBI/NDWI in a single sweep over the scene.
+@njit(parallel=True, fastmath=FASTMATH_FLAGS, cache=True)
+def compute_indices(grn, red, nir, swir, scl, valid_lut, out_v, out_b, out_w):
+    H, W = grn.shape
+    for i in prange(H):
+        for j in range(W):
+            g = np.float32(grn[i, j])
+            if g == 0 or not valid_lut[int(scl[i, j])]:
+                out_v[i, j] = np.nan
+                out_b[i, j] = np.nan
+                out_w[i, j] = np.nan
+                continue
+
+            r = np.float32(red[i, j])
+            n = np.float32(nir[i, j])
+            w = np.float32(swir[i, j])
+            d = n + r
+            out_v[i, j] = (n - r) / (d if d != 0 else 0.0001)  # Vegetation
+            d = w + n
+            out_b[i, j] = (w - n) / (d if d != 0 else 0.0001)  # Buildings
+            d = g + n
+            out_w[i, j] = (g - n) / (d if d != 0 else 0.0001)  # Water
+
+def compute_indices_numpy(grn, red, nir, swir, scl, valid_lut, out_v, out_b, out_w):
+    mask_invalid = (~valid_lut[scl.astype(np.uint8)]) | (grn == 0)
+    tmp = np.empty_like(out_v)
+    calculate_index(nir, red, out=out_v, tmp=tmp)
+    calculate_index(swir, nir, out=out_b, tmp=tmp)
+    calculate_index(grn, nir, out=out_w, tmp=tmp)
+    for out in (out_v, out_b, out_w):
+        out[mask_invalid] = np.nan
+
+def build_stack_vrt(band_paths, ref):
+    """
+    In-memory VRT (XML string) stacking every band file as one band on the reference 10m grid.
+    GDAL resamples the 20m bands per source, so one read() returns the whole (bands, H, W) stack.
+    """
+    bands = []
+    for i, (b_key, bp) in enumerate(zip(TARGET_BANDS, band_paths), start=1):
+        with rasterio.open(bp) as src:
+            sw, sh = src.width, src.height
+        resampling = BAND_RESAMPLING.get(b_key, Resampling.nearest).name
+        bands.append(
+            f'<VRTRasterBand dataType="UInt16" band="{i}">'
+            f'<ComplexSource resampling="{resampling}">'
+            f'<SourceFilename relativeToVRT="0">{escape(bp)}</SourceFilename><SourceBand>1</SourceBand>'
+            f'<SrcRect xOff="0" yOff="0" xSize="{sw}" ySize="{sh}"/>'
+            f'<DstRect xOff="0" yOff="0" xSize="{ref.width}" ySize="{ref.height}"/>'
+            f'</ComplexSource></VRTRasterBand>'
+        )
+    geo = ", ".join(str(v) for v in ref.transform.to_gdal())
+    return (f'<VRTDataset rasterXSize="{ref.width}" rasterYSize="{ref.height}">'
+            f'<SRS>{escape(ref.crs.to_wkt())}</SRS><GeoTransform>{geo}</GeoTransform>'
+            + "".join(bands) + '</VRTDataset>')
+
+# Fused kernel: valid/threshold pixel counts of every scanned column in one pass
+@njit(parallel=True, fastmath=FASTMATH_FLAGS, cache=True)
+def count_thresholds(ndvi, ndbi, ndwi, stride, t_veg, t_build, t_water):
+    H, W = ndvi.shape
+    num_cols = (W + stride - 1) // stride
+    cnt_veg = np.zeros(num_cols, dtype=np.int32)
+    cnt_build = np.zeros(num_cols, dtype=np.int32)
+    cnt_water = np.zeros(num_cols, dtype=np.int32)
+    cnt_valid = np.zeros(num_cols, dtype=np.int32)
+    # Compare in float32 like NumPy does for float32 arrays vs Python floats
+    thr_veg, thr_build, thr_water = np.float32(t_veg), np.float32(t_build), np.float32(t_water)
+    for c in prange(num_cols):
+        t = c * stride
+        for r in range(H):
+            v = ndvi[r, t]
+            if math.isnan(v):
+                continue  # Mask is shared by all three indices
+            cnt_valid[c] += 1
+            if v > thr_veg: cnt_veg[c] += 1
+            if ndbi[r, t] > thr_build: cnt_build[c] += 1
+            if ndwi[r, t] > thr_water: cnt_water[c] += 1
+    return cnt_veg, cnt_build, cnt_water, cnt_valid
+
+def count_thresholds_numpy(ndvi, ndbi, ndwi, stride, t_veg, t_build, t_water):
+    # NaN never passes a threshold
+    col_ndvi = ndvi[:, ::stride]
+    return (np.sum(col_ndvi > t_veg, axis=0),
+            np.sum(ndbi[:, ::stride] > t_build, axis=0),
+            np.sum(ndwi[:, ::stride] > t_water, axis=0),
+            np.sum(~np.isnan(col_ndvi), axis=0))
+
+# One-pass NaN-aware count / sum / sum of squares (float64 accumulators)
+@njit(parallel=True, fastmath=FASTMATH_FLAGS, cache=True)
+def nan_moments(arr):
+    H, W = arr.shape
+    n = 0
+    s1 = 0.0
+    s2 = 0.0
+    for i in prange(H):
+        for j in range(W):
+            v = arr[i, j]
+            if not math.isnan(v):
+                n += 1
+                s1 += v
+                s2 += v * v
+    return n, s1, s2
+
+def nan_moments_numpy(arr):
+    return np.isfinite(arr).sum(), np.nansum(arr, dtype=np.float64), np.nansum(arr * arr, dtype=np.float64)
+
+def get_global_stats(m_data):
+    # mean/std from sum and sum of squares: no masked copy, no separate mean and std passes
+    n, s1, s2 = (nan_moments if HAS_NUMBA else nan_moments_numpy)(m_data)
+    if n == 0: return 0, 1
+    mean = s1 / n
+    return mean, math.sqrt(max(s2 / n - mean * mean, 0.0))
+
+def col_means(arr, valid_cols, n_valid):
+    # NaN-aware mean of every scanned column as one masked sum / count
+    return np.where(valid_cols, arr[:, ::SCAN_STRIDE], 0).sum(axis=0) / n_valid
 
 def get_zscore(val, mean, std):
-    if std == 0: return 0
-    z = (val - mean) / std
-    return float(z)
+    if std == 0: return np.zeros_like(val)
+    return (val - mean) / std
 
 # Data amplification function for audio (Robust Norm)
 def normalize_robust(data):
@@ -55,139 +216,144 @@ def normalize_robust(data):
     norm = (data - p2) / (p98 - p2)
     return np.clip(norm, 0, 1)
 
-def process_s2_area_music():
-    print(f">>> Sentinel-2 Data Gen (Tuned Thresholds)...")
-    print(f"    THRESHOLDS -> Veg: {VEG_THRESHOLD}, Build: {BUILD_THRESHOLD}, Water: {WATER_THRESHOLD}")
+def _init_worker(n_proc):
+    # Share the cores between worker processes instead of every Numba kernel grabbing all of them
+    if HAS_NUMBA:
+        numba.set_num_threads(max(1, numba.config.NUMBA_NUM_THREADS // n_proc))
+
+def _process_one_folder(folder):
+    tif_files = glob.glob(os.path.join(folder, "*.tif"))
+    if not tif_files: return
     
-    s2_folders = sorted([f for f in glob.glob(os.path.join(RAW_S2_DIR, "*")) if os.path.isdir(f)])
+    sample_file = os.path.basename(tif_files[0])
+    m = _DATE_RE.search(sample_file)
+    if not m: return
+    date_str = m.group(1)
+    out_json = os.path.join(OUT_SCORE_DIR, f"{date_str}_Music_Score.json")
     
-    for folder in s2_folders:
-        tif_files = glob.glob(os.path.join(folder, "*.tif"))
-        if not tif_files: continue
-        
-        sample_file = os.path.basename(tif_files[0])
-        m = re.search(r"_(\d{8})T", sample_file)
-        if not m: continue
-        date_str = m.group(1)
-        out_json = os.path.join(OUT_SCORE_DIR, f"{date_str}_Music_Score.json")
-        
-        print(f"\nProcessing [{date_str}]...")
-
-        def find_band(b_key):
-            c = [f for f in tif_files if b_key in f]
-            return c[0] if c else None
-
-        band_paths = [find_band(b) for b in TARGET_BANDS]
-        if None in band_paths: continue
-        
-        try:
-            with rasterio.open(band_paths[0]) as src_ref:
-                H, W = src_ref.shape
-                stack = np.zeros((len(TARGET_BANDS), H, W), dtype=np.float32)
-
-            for i, bp in enumerate(band_paths):
-                with rasterio.open(bp) as src:
-                    if src.shape != (H, W):
-                        arr = src.read(1, out_shape=(H, W), resampling=Resampling.nearest)
-                    else:
-                        arr = src.read(1)
-                    stack[i] = arr
-
-            # Masking
-            scl = stack[-1]
-            mask_invalid = (~np.isin(scl, VALID_SCL_CLASSES)) | (stack[0] == 0)
-            
-            b_grn   = stack[0]
-            b_red   = stack[1]
-            b_nir   = stack[2]
-            b_swir  = stack[3]
-
-            for b_arr in [b_grn, b_red, b_nir, b_swir]:
-                b_arr[mask_invalid] = np.nan
-
-            # 1. Raw Indices (For area calculation)
-            ndvi_raw = calculate_index(b_nir, b_red)  # Vegetation
-            ndbi_raw = calculate_index(b_swir, b_nir) # Buildings
-            ndwi_raw = calculate_index(b_grn, b_nir)  # Water
-
-            # 2. Normalized Indices (For sound/music)
-            ndvi_norm = normalize_robust(ndvi_raw)
-            ndbi_norm = normalize_robust(ndbi_raw)
-            ndwi_norm = normalize_robust(ndwi_raw)
-
-            # 3. Global Stats for Z-score
-            def get_global_stats(m_data):
-                valid = m_data[~np.isnan(m_data)]
-                if valid.size == 0: return 0, 1
-                return np.mean(valid), np.std(valid)
-
-            ndvi_mean, ndvi_std = get_global_stats(ndvi_raw)
-            ndbi_mean, ndbi_std = get_global_stats(ndbi_raw)
-
-            daily_score = []
-
-            # 4. Scan and Area Calculation
-            for t in range(0, W, SCAN_STRIDE):
-                # A. Data for Sound (Mean Intensity)
-                def get_col_mean(col):
-                    v = col[~np.isnan(col)]
-                    return float(np.mean(v)) if v.size > 0 else 0.0
-
-                v_ndvi = get_col_mean(ndvi_norm[:, t])
-                v_ndbi = get_col_mean(ndbi_norm[:, t])
-                v_ndwi = get_col_mean(ndwi_norm[:, t])
-
-                # Z-Score (For pitch)
-                raw_ndvi_mean = get_col_mean(ndvi_raw[:, t])
-                raw_ndbi_mean = get_col_mean(ndbi_raw[:, t])
-                z_ndvi = get_zscore(raw_ndvi_mean, ndvi_mean, ndvi_std)
-                z_ndbi = get_zscore(raw_ndbi_mean, ndbi_mean, ndbi_std)
-
-                # B. ★ Data for Visualization (Area %) - Applied Tuned Thresholds
-                col_ndvi_raw = ndvi_raw[:, t]
-                col_ndbi_raw = ndbi_raw[:, t]
-                col_ndwi_raw = ndwi_raw[:, t]
-                
-                valid_pixels = np.sum(~np.isnan(col_ndvi_raw)) # Number of valid pixels
-                
-                if valid_pixels > 0:
-                    # Apply modified thresholds
-                    pct_veg   = np.sum(col_ndvi_raw > VEG_THRESHOLD)   / valid_pixels
-                    pct_build = np.sum(col_ndbi_raw > BUILD_THRESHOLD) / valid_pixels
-                    pct_water = np.sum(col_ndwi_raw > WATER_THRESHOLD) / valid_pixels
-                else:
-                    pct_veg, pct_build, pct_water = 0.0, 0.0, 0.0
-
-                # Rhythm Triggers (For sound)
-                r_kick  = v_ndbi if v_ndbi > 0.05 else 0.0 
-                r_snare = v_ndvi if v_ndvi > 0.1 else 0.0
-                r_hihat = v_ndwi if v_ndwi > 0.05 else 0.0 
-
-                daily_score.append({
-                    "time_step": t,
-                    "melody": { 
-                        "ndvi": {"vol": v_ndvi, "zscore": z_ndvi}, 
-                        "ndbi": {"vol": v_ndbi, "zscore": z_ndbi}, 
-                        "ndwi": {"vol": v_ndwi, "zscore": 0.0}
-                    },
-                    "visuals": { 
-                        "pct_veg": float(pct_veg),
-                        "pct_build": float(pct_build),
-                        "pct_water": float(pct_water)
-                    },
-                    "rhythm": {
-                        "kick": r_kick,
-                        "snare": r_snare,
-                        "hihat": r_hihat
-                    }
-                })
+    print(f"\nProcessing [{date_str}]...")
 
+    # Classify the files once instead of scanning the list for every band
+    band_map = {}
+    for f in tif_files:
+        name = os.path.basename(f)
+        for b in TARGET_BANDS:
+            if b in name:
+                band_map.setdefault(b, f)
+                break
+
+    band_paths = [band_map.get(b) for b in TARGET_BANDS]
+    if None in band_paths: return
+    
+    try:
+        with rasterio.open(band_paths[0]) as src_ref:
+            H, W = src_ref.shape
+            stack_vrt = build_stack_vrt(band_paths, src_ref)
+
+        # Native L2A dtype (reflectance x10000 / SCL class); indices are computed in float32
+        stack = np.zeros((len(TARGET_BANDS), H, W), dtype=np.uint16)
+        with rasterio.open(stack_vrt) as src:
+            src.read(out=stack)
+
+        b_grn   = stack[0]
+        b_red   = stack[1]
+        b_nir   = stack[2]
+        b_swir  = stack[3]
+        scl     = stack[-1]
+
+        # 1. Raw Indices (For area calculation), invalid pixels (SCL / nodata) -> NaN
+        ndvi_raw, ndbi_raw, ndwi_raw = get_index_buffers((H, W))  # Vegetation, Buildings, Water
+        fused = compute_indices if HAS_NUMBA else compute_indices_numpy
+        fused(b_grn, b_red, b_nir, b_swir, scl, VALID_SCL_LUT, ndvi_raw, ndbi_raw, ndwi_raw)
+
+        # 2. Normalized Indices (For sound/music)
+        ndvi_norm = normalize_robust(ndvi_raw)
+        ndbi_norm = normalize_robust(ndbi_raw)
+        ndwi_norm = normalize_robust(ndwi_raw)
+
+        # 3. Global Stats for Z-score
+        ndvi_mean, ndvi_std = get_global_stats(ndvi_raw)
+        ndbi_mean, ndbi_std = get_global_stats(ndbi_raw)
+
+        daily_score = []
+
+        # 4. Scan and Area Calculation (all scanned columns at once)
+        time_steps = np.arange(0, W, SCAN_STRIDE)
+
+        # Valid and above-threshold pixel counts per scanned column (one fused pass)
+        counter = count_thresholds if HAS_NUMBA else count_thresholds_numpy
+        cnt_veg, cnt_build, cnt_water, cnt_valid = counter(
+            ndvi_raw, ndbi_raw, ndwi_raw, SCAN_STRIDE, VEG_THRESHOLD, BUILD_THRESHOLD, WATER_THRESHOLD)
+        valid_pixels = np.maximum(cnt_valid, 1) # Number of valid pixels
+
+        # All indices share one NaN mask
+        valid_cols = ~np.isnan(ndvi_raw[:, ::SCAN_STRIDE])
+
+        # A. Data for Sound (Mean Intensity), 0.0 for columns without valid pixels
+        v_ndvi = col_means(ndvi_norm, valid_cols, valid_pixels)
+        v_ndbi = col_means(ndbi_norm, valid_cols, valid_pixels)
+        v_ndwi = col_means(ndwi_norm, valid_cols, valid_pixels)
+
+        # Z-Score (For pitch)
+        z_ndvi = get_zscore(col_means(ndvi_raw, valid_cols, valid_pixels), ndvi_mean, ndvi_std)
+        z_ndbi = get_zscore(col_means(ndbi_raw, valid_cols, valid_pixels), ndbi_mean, ndbi_std)
+
+        # B. ★ Data for Visualization (Area %) - Applied Tuned Thresholds
+        pct_veg   = cnt_veg   / valid_pixels
+        pct_build = cnt_build / valid_pixels
+        pct_water = cnt_water / valid_pixels
+
+        # Rhythm Triggers (For sound)
+        r_kick  = np.where(v_ndbi > 0.05, v_ndbi, 0.0)
+        r_snare = np.where(v_ndvi > 0.1, v_ndvi, 0.0)
+        r_hihat = np.where(v_ndwi > 0.05, v_ndwi, 0.0)
+
+        columns = zip(time_steps.tolist(), v_ndvi.tolist(), v_ndbi.tolist(), v_ndwi.tolist(),
+                      z_ndvi.tolist(), z_ndbi.tolist(), pct_veg.tolist(), pct_build.tolist(),
+                      pct_water.tolist(), r_kick.tolist(), r_snare.tolist(), r_hihat.tolist())
+        for t, vv, vb, vw, zv, zb, pv, pb, pw, rk, rs, rh in columns:
+            daily_score.append({
+                "time_step": t,
+                "melody": { 
+                    "ndvi": {"vol": vv, "zscore": zv}, 
+                    "ndbi": {"vol": vb, "zscore": zb}, 
+                    "ndwi": {"vol": vw, "zscore": 0.0}
+                },
+                "visuals": { 
+                    "pct_veg": pv,
+                    "pct_build": pb,
+                    "pct_water": pw
+                },
+                "rhythm": {
+                    "kick": rk,
+                    "snare": rs,
+                    "hihat": rh
+                }
+            })
+
+        # Values are already plain Python numbers (tolist above), no per-value float() needed
+        if orjson is not None:
+            with open(out_json, "wb") as f:
+                f.write(orjson.dumps(daily_score))
+        else:
             with open(out_json, "w") as f:
                 json.dump(daily_score, f)
-            print(f"  ✓ JSON Saved: {os.path.basename(out_json)}")
+        print(f"  ✓ JSON Saved: {os.path.basename(out_json)}")
+
+    except Exception as e:
+        print(f"  ❌ Error {date_str}: {e}")
+
+def process_s2_area_music():
+    print(f">>> Sentinel-2 Data Gen (Tuned Thresholds)...")
+    print(f"    THRESHOLDS -> Veg: {VEG_THRESHOLD}, Build: {BUILD_THRESHOLD}, Water: {WATER_THRESHOLD}")
+    
+    s2_folders = sorted([f for f in glob.glob(os.path.join(RAW_S2_DIR, "*")) if os.path.isdir(f)])
+    if not s2_folders: return
 
-        except Exception as e:
-            print(f"  ❌ Error {date_str}: {e}")
+    # Scenes are independent: one process per date folder
+    n_proc = max(1, min(MAX_WORKERS, cpu_count(), len(s2_folders)))
+    with Pool(processes=n_proc, initializer=_init_worker, initargs=(n_proc,)) as pool:
+        pool.map(_process_one_folder, s2_folders, chunksize=1)
 
 if __name__ == "__main__":
     process_s2_area_music()
\ No newline at end of file
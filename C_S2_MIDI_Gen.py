@@ -3,9 +3,21 @@ import os
 import glob
 import json
 import numpy as np
-import random
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from midiutil import MIDIFile
 
+try:
+    import orjson
+except ImportError:  # Standard json fallback
+    orjson = None
+
+try:
+    from numba import njit
+except ImportError:  # Same brain logic, run as plain Python (slower)
+    def njit(*args, **kwargs):
+        return lambda f: f
+
 BASE_DIR = os.getcwd()
 INPUT_SCORE_DIR = os.path.join(BASE_DIR, "processed_data", "Daily_Music_Scores")
 OUT_MIDI_DIR = os.path.join(BASE_DIR, "processed_data", "Daily_MIDI")
@@ -20,6 +32,12 @@ SCALE = [
     72, 75, 77, 78, 79, 82,       # C5 (High)
     84, 87, 89, 90, 91, 94        # C6 (Top)
 ]
+SCALE_ARR = np.array(SCALE, dtype=np.int32)
+
+# Scale index window per register: (s_min, s_max)
+SCALE_RANGES = {"low": (0, 12), "mid": (6, 18), "high": (12, len(SCALE) - 1)}
+# Jumps used to break a boring (repetitive) melody
+BORING_JUMPS = np.array([2, 4, 7, -5], dtype=np.int64)
 
 INSTRUMENTS = {
     "piano": 0, "guitar": 29, "pad": 90
@@ -45,102 +63,240 @@ DRUM_PATTERNS = {
     ]
 }
 
+# Hit types (1: Kick, 2: Snare, 3: Closed HH, 4: Open HH) packed as bit flags per step
+DRUM_PATTERN_NAMES = ["basic", "groove", "break"]
+DRUM_PATTERN_BITS = np.array(
+    [[sum(1 << h for h in step) for step in DRUM_PATTERNS[name]] for name in DRUM_PATTERN_NAMES],
+    dtype=np.int64
+)
+# Fill-in for the last 4 steps of every 4th bar: [2], [2], [1,2], [4]
+FILL_IN_BITS = np.array([1 << 2, 1 << 2, (1 << 1) | (1 << 2), 1 << 4], dtype=np.int64)
+
 # ──────────────────────────────────────────────────────────
-# 3. Intelligent Logic Class (Brain)
+# 3. Intelligent Logic (Brain)
+#    Plain @njit functions over per-step arrays (no classes / jitclass in the hot loop)
 # ──────────────────────────────────────────────────────────
-class MelodyBrain:
-    def __init__(self, name, history_len=6):
-        self.name = name
-        self.history = []
-        self.history_len = history_len
-        self.last_note = None
-
-    def get_note(self, z_score, scale_mode="mid"):
-        norm = np.clip((z_score + 2.0) / 4.0, 0.0, 1.0)
-        
-        if scale_mode == "low": s_min, s_max = 0, 12
-        elif scale_mode == "high": s_min, s_max = 12, len(SCALE)-1
-        else: s_min, s_max = 6, 18
-            
+@njit(cache=True)
+def melody_brain_run(zscore, vol, s_min, s_max, history_len, jump_pick, coin):
+    """
+    Picks a scale index for every step with vol > 0.
+    Returns (note_idx, bored, emit) arrays; repetitive phrases are broken up by a jump.
+    jump_pick (int, index into BORING_JUMPS) / coin (uniform [0, 1)) are pre-drawn per step.
+    """
+    n = zscore.shape[0]
+    scale_len = SCALE_ARR.shape[0]
+    note_idx = np.zeros(n, dtype=np.int64)
+    bored = np.zeros(n, dtype=np.bool_)
+    emit = np.zeros(n, dtype=np.bool_)
+
+    # Ring buffer of the last history_len scale indices (hlen = total pushed so far)
+    history = np.zeros(history_len, dtype=np.int8)
+    hlen = 0
+    last_note = -1
+
+    for i in range(n):
+        if vol[i] <= 0.0:
+            continue
+        emit[i] = True
+
+        norm = min(max((zscore[i] + 2.0) / 4.0, 0.0), 1.0)
         target_idx = int(s_min + norm * (s_max - s_min))
-        target_idx = np.clip(target_idx, 0, len(SCALE) - 1)
+        target_idx = min(max(target_idx, 0), scale_len - 1)
+
+        # Boring if the last 4 notes use 2 or fewer distinct values:
+        # OR their one-hot bits (scale index < 64) and count set bits, no set() / slicing
+        mask = 0
+        for k in range(1, 5):
+            mask |= 1 << int(history[(hlen - k) % history_len])
+        distinct = 0
+        while mask:
+            mask &= mask - 1
+            distinct += 1
+        is_boring = hlen >= 4 and distinct <= 2
 
-        is_boring = False
-        if len(self.history) >= 4:
-            if len(set(self.history[-4:])) <= 2: is_boring = True
-        
         if is_boring:
-            jump = random.choice([2, 4, 7, -5]) 
-            target_idx = np.clip(target_idx + jump, 0, len(SCALE) - 1)
-        elif target_idx == self.last_note:
-            target_idx += 1 if random.random() > 0.5 else -1
-            
-        target_idx = np.clip(target_idx, 0, len(SCALE) - 1)
-        note = SCALE[target_idx]
-        self.last_note = target_idx
-        self.history.append(target_idx)
-        if len(self.history) > self.history_len: self.history.pop(0)
-            
-        return note, is_boring
-
-class DrumBrain:
-    def __init__(self):
-        self.bar_count = 0
-        self.current_pattern_name = "basic"
-        self.step_in_bar = 0
-        
-        # ★ Crash Cymbal Cooldown (Avoid repetition)
-        self.crash_cooldown = 0 
-    
-    def get_beat(self, step_idx, data_intensity):
-        self.step_in_bar = step_idx % 16
-        
+            jump = BORING_JUMPS[jump_pick[i]]
+            target_idx = min(max(target_idx + jump, 0), scale_len - 1)
+        elif target_idx == last_note:
+            target_idx += 1 if coin[i] > 0.5 else -1
+
+        target_idx = min(max(target_idx, 0), scale_len - 1)
+        last_note = target_idx
+        history[hlen % history_len] = target_idx
+        hlen += 1
+
+        note_idx[i] = target_idx
+        bored[i] = is_boring
+
+    return note_idx, bored, emit
+
+@njit(cache=True)
+def drum_brain_run(intensity, hihat):
+    """
+    Returns (hit_bits, crash) per step: pattern switches every 4 bars by data intensity,
+    a fill-in closes every 4th bar, and the crash cymbal has a 32-step cooldown.
+    """
+    n = intensity.shape[0]
+    hit_bits = np.zeros(n, dtype=np.int64)
+    crash = np.zeros(n, dtype=np.bool_)
+
+    bar_count = 0
+    pattern = 0  # basic
+    crash_cooldown = 0
+
+    for i in range(n):
+        step_in_bar = i % 16
+
         # Decrease cooldown
-        if self.crash_cooldown > 0:
-            self.crash_cooldown -= 1
-        
-        if self.step_in_bar == 0 and step_idx > 0:
-            self.bar_count += 1
-            if self.bar_count % 4 == 0:
-                if data_intensity > 0.5: self.current_pattern_name = "break"
-                elif data_intensity > 0.2: self.current_pattern_name = "groove"
-                else: self.current_pattern_name = "basic"
-        
-        if (self.bar_count + 1) % 4 == 0 and self.step_in_bar >= 12:
-            return self.generate_fill_in(self.step_in_bar)
-            
-        return DRUM_PATTERNS[self.current_pattern_name][self.step_in_bar]
-
-    def generate_fill_in(self, step_in_bar):
-        if step_in_bar == 12: return [2] 
-        if step_in_bar == 13: return [2] 
-        if step_in_bar == 14: return [1, 2] 
-        if step_in_bar == 15: return [4] 
-        return []
-    
-    # ★ Crash Request Handling
-    def try_crash(self):
-        # Fire only when cooldown is 0
-        if self.crash_cooldown == 0:
-            self.crash_cooldown = 32 # Don't fire again for 2 bars (32 steps)
-            return True
-        return False
+        if crash_cooldown > 0:
+            crash_cooldown -= 1
+
+        if step_in_bar == 0 and i > 0:
+            bar_count += 1
+            if bar_count % 4 == 0:
+                if intensity[i] > 0.5: pattern = 2    # break
+                elif intensity[i] > 0.2: pattern = 1  # groove
+                else: pattern = 0                     # basic
+
+        if (bar_count + 1) % 4 == 0 and step_in_bar >= 12:
+            hit_bits[i] = FILL_IN_BITS[step_in_bar - 12]
+        else:
+            hit_bits[i] = DRUM_PATTERN_BITS[pattern, step_in_bar]
+
+        # ★ Crash when hihat value (actually NDWI/Water) is high (> 0.4), only if cooldown is 0
+        if hihat[i] > 0.4 and crash_cooldown == 0:
+            crash_cooldown = 32 # Don't fire again for 2 bars (32 steps)
+            crash[i] = True
+
+    return hit_bits, crash
 
 # ──────────────────────────────────────────────────────────
 # 4. Utilities
 # ──────────────────────────────────────────────────────────
 def map_vol(val, boost=False):
     base = 85 if boost else 65
-    return int(np.clip(base + val * 40, 0, 127))
+    return int(min(max(base + val * 40, 0), 127))
 
-def humanize(vol):
+def humanize(vol, change):
+    # change: pre-drawn jitter in [-8, 8]
     if vol == 0: return 0
-    change = random.randint(-8, 8)
-    return int(np.clip(vol + change, 1, 127))
+    return int(min(max(vol + change, 1), 127))
+
+def load_json(path):
+    if orjson is not None:
+        with open(path, "rb") as f: return orjson.loads(f.read())
+    with open(path, "r") as f: return json.load(f)
 
 # ──────────────────────────────────────────────────────────
 # 5. Main Conversion Logic
 # ──────────────────────────────────────────────────────────
+# Humanize jitter columns in the per-step draw table
+HUM_KICK, HUM_SNARE, HUM_HH_CLOSED, HUM_HH_OPEN, HUM_PIANO, HUM_GUITAR, HUM_PAD = range(7)
+
+def file_rng(jpath):
+    # Stable per-file seed (str hash() is salted per process), so reruns give the same MIDI
+    return np.random.default_rng(zlib.crc32(os.path.basename(jpath).encode("utf-8")))
+
+def _process_one(jpath):
+    """Worker: one score JSON -> one MIDI file. Returns (out_name, ok, err)."""
+    out_name = os.path.basename(jpath).replace(".json", ".mid")
+    try:
+        data = load_json(jpath)
+        
+        mid = MIDIFile(4) 
+        mid.addTempo(0, 0, TEMPO)
+        
+        mid.addProgramChange(0, 0, 0, INSTRUMENTS["piano"]) 
+        mid.addProgramChange(1, 1, 1, INSTRUMENTS["guitar"])
+        mid.addProgramChange(2, 2, 2, INSTRUMENTS["pad"])
+        
+        # Pre-parse JSON into per-step arrays for the brain kernels
+        n = len(data)
+        kick = np.zeros(n); snare = np.zeros(n); hihat = np.zeros(n)
+        ndvi_z = np.zeros(n); ndvi_v = np.zeros(n)
+        ndbi_z = np.zeros(n); ndbi_v = np.zeros(n)
+        pad_v = np.zeros(n)
+        for i, step_data in enumerate(data):
+            r = step_data.get("rhythm", {})
+            m = step_data.get("melody", {})
+            kick[i] = r.get("kick", 0); snare[i] = r.get("snare", 0); hihat[i] = r.get("hihat", 0)
+            if "ndvi" in m:
+                ndvi_z[i] = m["ndvi"].get("zscore", 0.0); ndvi_v[i] = m["ndvi"].get("vol", 0.0)
+            if "ndbi" in m:
+                ndbi_z[i] = m["ndbi"].get("zscore", 0.0); ndbi_v[i] = m["ndbi"].get("vol", 0.0)
+            # Check if JSON key changed to 'ndwi' (or backward compatible with 'ndmi')
+            pad_key = "ndwi" if "ndwi" in m else "ndmi"
+            if pad_key in m:
+                pad_v[i] = m[pad_key].get("vol", 0.0)
+
+        # All randomness for the file drawn up front in one fixed order (no per-note random.* calls)
+        rng = file_rng(jpath)
+        n_jumps = BORING_JUMPS.shape[0]
+        piano_jump, guitar_jump = rng.integers(0, n_jumps, size=(2, n))
+        piano_coin, guitar_coin, rest_u = rng.random((3, n))
+        hum = rng.integers(-8, 9, size=(n, 7))
+
+        avg_intensity = (kick + snare + hihat) / 3.0
+        drum_bits, crash = drum_brain_run(avg_intensity, hihat)
+        piano_idx, piano_bored, piano_on = melody_brain_run(ndvi_z, ndvi_v, *SCALE_RANGES["mid"], 6, piano_jump, piano_coin)
+        guitar_idx, _, guitar_on = melody_brain_run(ndbi_z, ndbi_v, *SCALE_RANGES["low"], 6, guitar_jump, guitar_coin)
+
+        step_dur = 0.25
+        # (track, channel, pitch, time, duration, volume); flushed to MIDIFile in one sorted pass
+        events = []
+
+        for i in range(n):
+            t = i * step_dur
+
+            # -------------------------------------------------
+            # 1. DRUM
+            # -------------------------------------------------
+            bits = drum_bits[i]
+            if bits & (1 << 1):
+                vol = 80 + int(kick[i]*40)
+                events.append((3, DRUM_CH, 36, t, step_dur, humanize(vol, hum[i, HUM_KICK])))
+            if bits & (1 << 2):
+                vol = 90 + int(snare[i]*30)
+                events.append((3, DRUM_CH, 38, t, step_dur, humanize(vol, hum[i, HUM_SNARE])))
+            if bits & (1 << 3):
+                events.append((3, DRUM_CH, 42, t, step_dur, humanize(60, hum[i, HUM_HH_CLOSED])))
+            if bits & (1 << 4):
+                events.append((3, DRUM_CH, 46, t, step_dur, humanize(85, hum[i, HUM_HH_OPEN])))
+
+            # ★ Crash Cymbal (cooldown handled in drum_brain_run)
+            if crash[i]:
+                events.append((3, DRUM_CH, 49, t, step_dur, 110)) # Crash!
+
+            # -------------------------------------------------
+            # 2. MELODY
+            # -------------------------------------------------
+            if piano_on[i]:
+                bored = bool(piano_bored[i])
+                # If bored, insert rest with 20% probability
+                if not (bored and rest_u[i] < 0.2):
+                    events.append((0, 0, SCALE[piano_idx[i]], t, step_dur, humanize(map_vol(ndvi_v[i], bored), hum[i, HUM_PIANO])))
+
+            # Guitar plays only on 8th notes (even steps) to create rhythm
+            if guitar_on[i] and i % 2 == 0:
+                events.append((1, 1, SCALE[guitar_idx[i]], t, step_dur * 2, humanize(map_vol(ndbi_v[i]), hum[i, HUM_GUITAR])))
+
+            # NDWI (Water) -> Pad
+            if pad_v[i] > 0.0:
+                events.append((2, 2, 60, t, step_dur * 4, humanize(int(50 + pad_v[i]*30), hum[i, HUM_PAD])))
+
+        events.sort(key=lambda e: (e[3], e[0]))
+        for track, ch, pitch, t, dur, vol in events:
+            mid.addNote(track, ch, pitch, t, dur, vol)
+
+        out_path = os.path.join(OUT_MIDI_DIR, out_name)
+        with open(out_path, "wb") as f:
+            mid.writeFile(f)
+        return out_name, True, None
+
+    except Exception:
+        import traceback
+        return out_name, False, traceback.format_exc()
+
 def convert_s2_midi_final():
     json_files = glob.glob(os.path.join(INPUT_SCORE_DIR, "*.json"))
     
@@ -148,94 +304,13 @@ def convert_s2_midi_final():
         print("No JSON files found.")
         return
 
-    for jpath in json_files:
-        try:
-            with open(jpath, 'r') as f:
-                data = json.load(f)
-            
-            mid = MIDIFile(4) 
-            mid.addTempo(0, 0, TEMPO)
-            
-            mid.addProgramChange(0, 0, 0, INSTRUMENTS["piano"]) 
-            mid.addProgramChange(1, 1, 1, INSTRUMENTS["guitar"])
-            mid.addProgramChange(2, 2, 2, INSTRUMENTS["pad"])
-            
-            brain_piano = MelodyBrain("Piano")
-            brain_guitar = MelodyBrain("Guitar")
-            brain_drum = DrumBrain()
-            
-            t = 0
-            step_dur = 0.25
-            
-            for i, step_data in enumerate(data):
-                r = step_data.get("rhythm", {})
-                m = step_data.get("melody", {})
-                
-                # -------------------------------------------------
-                # 1. DRUM
-                # -------------------------------------------------
-                avg_intensity = (r.get("kick",0) + r.get("snare",0) + r.get("hihat",0)) / 3.0
-                drum_hits = brain_drum.get_beat(i, avg_intensity)
-                
-                for hit_type in drum_hits:
-                    if hit_type == 1: 
-                        vol = 80 + int(r.get("kick", 0)*40)
-                        mid.addNote(3, DRUM_CH, 36, t, step_dur, humanize(vol))
-                    elif hit_type == 2: 
-                        vol = 90 + int(r.get("snare", 0)*30)
-                        mid.addNote(3, DRUM_CH, 38, t, step_dur, humanize(vol))
-                    elif hit_type == 3: 
-                        mid.addNote(3, DRUM_CH, 42, t, step_dur, humanize(60))
-                    elif hit_type == 4: 
-                        mid.addNote(3, DRUM_CH, 46, t, step_dur, humanize(85))
-
-                # ★ Apply Crash Cymbal Cooldown
-                # Try crash if hihat value (actually NDWI/Water) is high (> 0.4)
-                if r.get("hihat", 0) > 0.4:
-                    if brain_drum.try_crash(): # Check Cooldown
-                        mid.addNote(3, DRUM_CH, 49, t, step_dur, 110) # Crash!
-
-                # -------------------------------------------------
-                # 2. MELODY
-                # -------------------------------------------------
-                if "ndvi" in m:
-                    z = m["ndvi"].get("zscore", 0.0)
-                    v = m["ndvi"].get("vol", 0.0)
-                    if v > 0.0:
-                        note, bored = brain_piano.get_note(z, "mid")
-                        # If bored, insert rest with 20% probability
-                        if not (bored and random.random() < 0.2):
-                            mid.addNote(0, 0, note, t, step_dur, humanize(map_vol(v, bored)))
-
-                if "ndbi" in m:
-                    z = m["ndbi"].get("zscore", 0.0)
-                    v = m["ndbi"].get("vol", 0.0)
-                    if v > 0.0:
-                        note, bored = brain_guitar.get_note(z, "low")
-                        # Guitar plays only on 8th notes (even steps) to create rhythm
-                        if i % 2 == 0:
-                            mid.addNote(1, 1, note, t, step_dur * 2, humanize(map_vol(v)))
-
-                # NDWI (Water) -> Pad
-                # Check if JSON key changed to 'ndwi' (or backward compatible with 'ndmi')
-                pad_key = "ndwi" if "ndwi" in m else "ndmi"
-                if pad_key in m:
-                    v = m[pad_key].get("vol", 0.0)
-                    if v > 0.0:
-                        mid.addNote(2, 2, 60, t, step_dur * 4, humanize(int(50 + v*30)))
-
-                t += step_dur
-            
-            out_name = os.path.basename(jpath).replace(".json", ".mid")
-            out_path = os.path.join(OUT_MIDI_DIR, out_name)
-            with open(out_path, "wb") as f:
-                mid.writeFile(f)
-            print(f"Generated MIDI: {out_name} (Crash Cooldown Applied)")
-            
-        except Exception as e:
-            print(f"Error {jpath}: {e}")
-            import traceback
-            traceback.print_exc()
+    # Each day is independent (own MIDIFile, own brains, own output) -> one process per file
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+        for jpath, (out_name, ok, err) in zip(json_files, ex.map(_process_one, json_files, chunksize=1)):
+            if ok:
+                print(f"Generated MIDI: {out_name} (Crash Cooldown Applied)")
+            else:
+                print(f"Error {jpath}:\n{err}")
 
 if __name__ == "__main__":
     convert_s2_midi_final()
\ No newline at end of file